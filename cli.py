@@ -2,20 +2,49 @@
 import click
 import csv
 from datetime import datetime
+import itertools
 import os
 import sqlite3
 from typing import Dict
 
-from domain.loans.ledger_calculator import LedgerCalculator
+from domain.loans.ledger_calculator import LedgerCalculator, UNITS_PER_CENT, to_decimal
+
+# Statements are kept as constants so each one is a stable key in sqlite3's statement cache
+_CREATE_EVENTS_DATE_INDEX = "create index if not exists idx_events_date on events(date_created);"
+_INSERT_EVENT = "insert into events (type, amount, date_created) values (?, ?, ?)"
+# Amounts are rounded to integer cents and `date_ordinal` matches `date.toordinal()`, so SQLite does
+# the per-event parsing. ISO-8601 dates compare correctly as strings, which lets SQLite range-scan
+# idx_events_date.
+_SELECT_EVENTS = (
+    "select type, cast(round(amount * 100) as integer) as amount_cents, "
+    "cast(julianday(date_created) - julianday('0001-01-01') as integer) + 1 as date_ordinal "
+    "from events where date_created <= ? order by date_created asc, id asc;"
+)
+_SELECT_ADVANCES = (
+    "select date_created, cast(round(amount * 100) as integer) as amount_cents "
+    "from events where type = 'advance' and date_created <= ? order by date_created asc, id asc;"
+)
+_CACHED_STATEMENTS = 1024
+# number of report lines buffered by `balances` between writes
+_OUTPUT_BLOCK_LINES = 10000
+
+
+def rows_chunks(rows, num_of_rows=10000):
+    """Split an iterable of rows into lists of at most `num_of_rows`"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, num_of_rows))
+        if not chunk: break
+        yield chunk
 
 
-def events_iterator(cursor, num_of_rows=1000):
-    """Events iterator to save memory"""
+def events_chunks(cursor, num_of_rows=50000):
+    """Yield fetched events in chunks to save memory"""
+    cursor.arraysize = num_of_rows
     while True:
         events = cursor.fetchmany(num_of_rows)
         if not events: break
-        for event in events:
-            yield event
+        yield events
 
 
 @click.group()
@@ -59,6 +88,7 @@ def create_db(ctx: Dict) -> None:
             );
         """
         )
+        cursor.execute(_CREATE_EVENTS_DATE_INDEX)
         connection.commit()
     click.echo(f"Initialized database at {ctx.obj['DB_PATH']}")
 
@@ -84,14 +114,22 @@ def load(ctx: Dict, filename: str) -> None:
         return
 
     loaded = 0
-    with open(filename) as infile, sqlite3.connect(ctx.obj["DB_PATH"]) as connection:
+    with open(filename) as infile, sqlite3.connect(
+        ctx.obj["DB_PATH"], cached_statements=_CACHED_STATEMENTS
+    ) as connection:
+        # the load is a one-shot bulk insert, so trade durability for speed
+        connection.execute("PRAGMA journal_mode=MEMORY")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        # databases created before the index was added to `create-db` get it here
+        connection.execute(_CREATE_EVENTS_DATE_INDEX)
         cursor = connection.cursor()
         reader = csv.reader(infile)
-        for row in reader:
-            cursor.execute(
-                f"insert into events (type, amount, date_created) values (?, ?, ?)", (row[0], row[2], row[1])
-            )
-            loaded += 1
+        rows = ((row[0], row[2], row[1]) for row in reader)
+        connection.execute("BEGIN")
+        for chunk in rows_chunks(rows):
+            cursor.executemany(_INSERT_EVENT, chunk)
+            loaded += len(chunk)
         connection.commit()
 
     click.echo(f"Loaded {loaded} events from {filename}")
@@ -108,32 +146,54 @@ def balances(ctx: Dict, end_date: str = None) -> None:
     #       Here is some code to get you started!
     if end_date is None:
         end_date = datetime.now().date().isoformat()
-
-    with sqlite3.connect(ctx.obj["DB_PATH"]) as connection:
+    else:
+        # end_date is compared with date_created as a string, so it must be exactly YYYY-MM-DD
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date().isoformat()
+
+    with sqlite3.connect(ctx.obj["DB_PATH"], cached_statements=_CACHED_STATEMENTS) as connection:
+        connection.execute("PRAGMA cache_size = -65536")
+        connection.execute("PRAGMA mmap_size = 268435456")
+        # the report reads the events table twice, so hold one read transaction across both queries
+        # to keep a concurrent `load` from shifting advances between them
+        connection.execute("BEGIN")
         cursor = connection.cursor()
-        cursor.row_factory = sqlite3.Row
-        cursor.execute('select * from events where date(date_created) <= date(?) order by date_created asc;', [end_date])
-        ledger_calculator = LedgerCalculator(events_iterator(cursor), end_date)
+        cursor.execute(_SELECT_EVENTS, [end_date])
+        ledger_calculator = LedgerCalculator(events_chunks(cursor), end_date)
         ledger_calculator.calculate_balances()
-    click.echo("Advances:")
-    click.echo("----------------------------------------------------------")
-
-    # NOTE: This initial print adheres to the format spec.
-    click.echo("{0:>10}{1:>11}{2:>17}{3:>20}".format("Identifier", "Date", "Initial Amt", "Current Balance"))
 
-    for index, advance in enumerate(ledger_calculator.advances, 1):
-        click.echo("{0:>10}{1:>11}{2:>17.2f}{3:>20.2f}".format(
-            index, advance['date'], advance['initial_amount'], advance['current_balance'], advance['date']
-        ))
+        # The report is buffered and written out in blocks rather than one echo per line
+        out = [
+            "Advances:\n",
+            "----------------------------------------------------------\n",
+            # NOTE: This initial print adheres to the format spec.
+            "{0:>10}{1:>11}{2:>17}{3:>20}\n".format("Identifier", "Date", "Initial Amt", "Current Balance"),
+        ]
+
+        # the calculator only keeps final balances, so stream the rest of each advance back from the
+        # database in the same order
+        cursor.execute(_SELECT_ADVANCES, [end_date])
+        index = 0
+        for index, ((date_created, amount_cents), current_balance) in enumerate(
+            zip(cursor, ledger_calculator.advance_balances), 1
+        ):
+            out.append("{0:>10}{1:>11}{2:>17.2f}{3:>20.2f}\n".format(
+                index, date_created, to_decimal(amount_cents * UNITS_PER_CENT), to_decimal(current_balance)
+            ))
+            if len(out) >= _OUTPUT_BLOCK_LINES:
+                click.echo("".join(out), nl=False)
+                out.clear()
+        if index != len(ledger_calculator.advance_balances) or cursor.fetchone() is not None:
+            raise click.ClickException("Advances changed while the balances report was being read")
 
     # print summary statistics
     # NOTE: These prints adhere to the format spec.
-    click.echo("\nSummary Statistics:")
-    click.echo("----------------------------------------------------------")
-    click.echo("Aggregate Advance Balance: {0:31.2f}".format(ledger_calculator.overall_advance_balance))
-    click.echo("Interest Payable Balance: {0:32.2f}".format(ledger_calculator.overall_interest_payable_balance))
-    click.echo("Total Interest Paid: {0:37.2f}".format(ledger_calculator.overall_interest_paid))
-    click.echo("Balance Applicable to Future Advances: {0:>19.2f}".format(ledger_calculator.overall_payments_for_future))
+    out.append("\nSummary Statistics:\n")
+    out.append("----------------------------------------------------------\n")
+    out.append("Aggregate Advance Balance: {0:31.2f}\n".format(to_decimal(ledger_calculator.overall_advance_balance)))
+    out.append("Interest Payable Balance: {0:32.2f}\n".format(to_decimal(ledger_calculator.overall_interest_payable_balance)))
+    out.append("Total Interest Paid: {0:37.2f}\n".format(to_decimal(ledger_calculator.overall_interest_paid)))
+    out.append("Balance Applicable to Future Advances: {0:>19.2f}\n".format(to_decimal(ledger_calculator.overall_payments_for_future)))
+    click.echo("".join(out), nl=False)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,16 @@
 from decimal import Decimal
-from datetime import datetime, timedelta
-from typing import Iterable, Tuple
+from datetime import date
+from typing import Iterable
+
+# Monetary amounts are tracked as integer units of 1e-8 cents, fine enough
+# to keep daily interest accrual precise without per-event Decimal math
+UNITS_PER_CENT = 10**8
+UNITS_PER_DOLLAR = 100 * UNITS_PER_CENT
+
+
+def to_decimal(units: int) -> Decimal:
+    """Convert integer units back to dollars for output"""
+    return Decimal(units) / UNITS_PER_DOLLAR
 
 
 class LedgerCalculator:
@@ -12,139 +22,125 @@ class LedgerCalculator:
     ) -> None:
         self.events = events
         self.end_date = end_date
+        # interest is accrued through the end of `end_date`
+        self.end_date_ordinal = date.fromisoformat(end_date).toordinal() + 1
         self.interest_rate = interest_rate
-        self.overall_advance_balance = Decimal(0)
-        self.overall_interest_payable_balance = Decimal(0)
-        self.overall_interest_paid = Decimal(0)
-        self.overall_payments_for_future = Decimal(0)
-        self.last_interest_date_calculated = None
-        self.advances = []
-        self.event_handlers = {
-            'advance': self._advance_event_handler,
-            'payment': self._payment_event_handler,
-        }
+        (
+            self.interest_rate_numerator,
+            self.interest_rate_denominator,
+        ) = interest_rate.as_integer_ratio()
+        self.overall_advance_balance = 0
+        self.overall_interest_payable_balance = 0
+        self.overall_interest_paid = 0
+        self.overall_payments_for_future = 0
+        self.last_interest_date_ordinal = None
+        # current balance of each advance, in creation order
+        self.advance_balances = []
+        # advances are paid off oldest first, so every advance before this
+        # index has a zero balance
+        self._first_unpaid_advance = 0
 
     def calculate_balances(self) -> None:
-        for event in self.events:
-            self.event_handlers[event['type']](event)
-        end_interest_date = datetime.strptime(self.end_date, '%Y-%m-%d').date()
-        end_interest_date = str(end_interest_date + timedelta(days=1))
-        self._calculate_interest_to_pay(interest_date=end_interest_date)
-
-    def _advance_event_handler(self, event) -> None:
-        self._calculate_interest_to_pay(interest_date=event['date_created'])
-        event_amount = Decimal(event['amount'])
-        current_balance_for_this_advance = self._pay_with_account_balance(
-            event_amount
-        )
-        self.advances.append(
-            {
-                "id": event['id'],
-                "date": event['date_created'],
-                "initial_amount": event_amount,
-                "current_balance": current_balance_for_this_advance,
-            }
-        )
-        self.overall_advance_balance += current_balance_for_this_advance
-
-    def _payment_event_handler(self, event) -> None:
-        self._calculate_interest_to_pay(interest_date=event['date_created'])
-        self._pay(payment_amount=Decimal(event['amount']))
-
-    def _calculate_interest_to_pay(self, interest_date: str = None) -> None:
-        if not self.last_interest_date_calculated:
-            self.last_interest_date_calculated = datetime.strptime(
-                interest_date, '%Y-%m-%d'
-            )
-            return
-
-        interest_date = datetime.strptime(interest_date, '%Y-%m-%d')
-        delta = interest_date - self.last_interest_date_calculated
-        total_days = delta.days
-
-        self.overall_interest_payable_balance += (
-            self.overall_advance_balance * self.interest_rate * total_days
-        )
-        self.last_interest_date_calculated = interest_date
-
-    def _pay_with_account_balance(self, advanced_amount: Decimal) -> Decimal:
-        # Check if there is a balance in the account, to deduct this new loan
-        # and return the new amount after the operation
-        if self._has_account_balance():
-            (
-                advanced_amount,
-                self.overall_payments_for_future,
-            ) = self._subtract_smaller_from_larger(
-                advanced_amount, self.overall_payments_for_future
-            )
-        return advanced_amount
-
-    def _has_account_balance(self) -> bool:
-        return bool(self.overall_payments_for_future)
-
-    def _pay(self, payment_amount: Decimal) -> None:
-        # First, to reduce the "*interest payable balance*" for the customer
-        if self._has_interest_balance_to_pay():
-            payment_amount = self._pay_interest(payment_amount)
-            if not payment_amount:
-                return
-
-        # Second, any remaining amount of the repayment is applied to reduce the "advance balance" of the *oldest* active
-        # advance, and if there is any remaining amount it reduces the amount of the following (second oldest) advance, and so
-        # on
-        if self._has_advanced_balances_to_pay():
-            payment_amount = self._pay_advanced_balances(payment_amount)
-            if not payment_amount:
-                return
-
-        # Finally - after *all* advances have been repaid - if there is still some amount of the repayment available, the remaining
-        # amount of the repayment should be credited towards to immediately paying down future advances
-        self.overall_payments_for_future += payment_amount
-
-    def _has_interest_balance_to_pay(self) -> bool:
-        return bool(self.overall_interest_payable_balance)
-
-    def _pay_interest(self, payment_amount: Decimal) -> Decimal:
-        if payment_amount >= self.overall_interest_payable_balance:
-            interest_paid = self.overall_interest_payable_balance
-            payment_amount -= interest_paid
-            self.overall_interest_payable_balance = Decimal(0)
-        else:
-            interest_paid = payment_amount
-            self.overall_interest_payable_balance -= interest_paid
-            payment_amount = Decimal(0)
-        self.overall_interest_paid += interest_paid
-        return payment_amount
-
-    def _has_advanced_balances_to_pay(self) -> bool:
-        return bool(self.overall_advance_balance)
-
-    def _pay_advanced_balances(self, payment_amount: Decimal) -> Decimal:
-        """Pay the "advance balance" of the *oldest* active advance,
-        and if there is any remaining amount it reduces the amount
-        of the following (second oldest) advance, and so on
+        """Consume `events` as chunks of `(type, amount_cents,
+        date_ordinal)` tuples, ordered by date
         """
-        amount_to_reduce = payment_amount
-        for advance in self.advances:
-            if advance['current_balance'] and amount_to_reduce:
-                (
-                    advance['current_balance'],
-                    amount_to_reduce,
-                ) = self._subtract_smaller_from_larger(
-                    advance['current_balance'], amount_to_reduce
-                )
-        if amount_to_reduce:
-            self.overall_advance_balance = Decimal(0)
-        else:
-            self.overall_advance_balance -= payment_amount
-
-        return amount_to_reduce
-
-    def _subtract_smaller_from_larger(
-        self, amount1: Decimal, amount2: Decimal
-    ) -> Tuple[Decimal, Decimal]:
-        """helper method to subtrac smaller amount from larger amount
-        and return them in same order"""
-        if amount1 < amount2:
-            return Decimal(0), amount2 - amount1
-        return amount1 - amount2, Decimal(0)
+        # This is a single serial scan on purpose: interest accrued between
+        # events depends on advance balances after earlier payments have
+        # been applied to interest first, so balances can't be derived from
+        # a running sum of signed amounts.
+        #
+        # Interest accrual and payment application are fused into one loop
+        # body, and running totals live in locals for the duration of the
+        # loop and are written back once at the end.
+        advance_balance = self.overall_advance_balance
+        interest_payable = self.overall_interest_payable_balance
+        interest_paid = self.overall_interest_paid
+        payments_for_future = self.overall_payments_for_future
+        last_date_ordinal = self.last_interest_date_ordinal
+        rate_numerator = self.interest_rate_numerator
+        rate_denominator = self.interest_rate_denominator
+        advance_balances = self.advance_balances
+        add_advance_balance = advance_balances.append
+        first_unpaid_advance = self._first_unpaid_advance
+
+        for chunk in self.events:
+            for event_type, amount_cents, date_ordinal in chunk:
+                # Accrue interest since the previous event
+                if last_date_ordinal is not None:
+                    interest_payable += (
+                        advance_balance
+                        * rate_numerator
+                        * (date_ordinal - last_date_ordinal)
+                        // rate_denominator
+                    )
+                last_date_ordinal = date_ordinal
+                amount = amount_cents * UNITS_PER_CENT
+
+                if event_type == 'advance':
+                    # Deduct any balance held for future advances first
+                    if payments_for_future:
+                        if amount < payments_for_future:
+                            payments_for_future -= amount
+                            amount = 0
+                        else:
+                            amount -= payments_for_future
+                            payments_for_future = 0
+                    add_advance_balance(amount)
+                    advance_balance += amount
+                    continue
+
+                # First, to reduce the "*interest payable balance*" for the customer
+                if interest_payable:
+                    if amount >= interest_payable:
+                        amount -= interest_payable
+                        interest_paid += interest_payable
+                        interest_payable = 0
+                    else:
+                        interest_payable -= amount
+                        interest_paid += amount
+                        continue
+
+                # Second, any remaining amount of the repayment is applied to reduce the "advance balance" of the *oldest* active
+                # advance, and if there is any remaining amount it reduces the amount of the following (second oldest) advance, and so
+                # on
+                if advance_balance and amount:
+                    remaining = amount
+                    while remaining and first_unpaid_advance < len(
+                        advance_balances
+                    ):
+                        balance = advance_balances[first_unpaid_advance]
+                        if balance <= remaining:
+                            remaining -= balance
+                            advance_balances[first_unpaid_advance] = 0
+                            first_unpaid_advance += 1
+                        else:
+                            advance_balances[first_unpaid_advance] = (
+                                balance - remaining
+                            )
+                            remaining = 0
+                    if remaining:
+                        advance_balance = 0
+                    else:
+                        advance_balance -= amount
+                    amount = remaining
+
+                # Finally - after *all* advances have been repaid - if there is still some amount of the repayment available, the remaining
+                # amount of the repayment should be credited towards to immediately paying down future advances
+                payments_for_future += amount
+
+        # Accrue interest through the end of `end_date`
+        if last_date_ordinal is not None:
+            interest_payable += (
+                advance_balance
+                * rate_numerator
+                * (self.end_date_ordinal - last_date_ordinal)
+                // rate_denominator
+            )
+        last_date_ordinal = self.end_date_ordinal
+
+        self.overall_advance_balance = advance_balance
+        self.overall_interest_payable_balance = interest_payable
+        self.overall_interest_paid = interest_paid
+        self.overall_payments_for_future = payments_for_future
+        self.last_interest_date_ordinal = last_date_ordinal
+        self._first_unpaid_advance = first_unpaid_advance
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 from cli import interface
 from click.testing import CliRunner
+from datetime import date
+from decimal import Decimal
+from domain.loans.ledger_calculator import LedgerCalculator, to_decimal
 import os
 import unittest
 
@@ -149,6 +152,81 @@ class CLITest(unittest.TestCase):
                 with open(output_path, "r") as correct_f:
                     self.assertEqual(correct_f.read(), result.output)
 
+    def test_large_ledger(self):
+        """
+        Test `balances` on a ledger large enough to cross the load, fetch
+        and output chunk sizes.
+        """
+        num_of_advances = 30000
+        with self.runner.isolated_filesystem(temp_dir="/tmp"):
+            # every advance of 100.00 is followed by a payment of 50.00 on the same day, so no interest accrues
+            # between events and payments pay off the oldest advances in full
+            with open("large.csv", "w") as outfile:
+                for _ in range(num_of_advances):
+                    outfile.write("advance,2021-01-01,100.00\n")
+                    outfile.write("payment,2021-01-01,50.00\n")
+            self.runner.invoke(interface, ["create-db"])
+            result = self.runner.invoke(interface, ["load", "large.csv"])
+            self.assertEqual(0, result.exit_code)
+            self.assertEqual(f"Loaded {2 * num_of_advances} events from large.csv\n", result.output)
+            result = self.runner.invoke(interface, ["balances", "2021-01-01"])
+            self.assertEqual(0, result.exit_code)
+            lines = result.output.splitlines()
+            advance_lines = lines[3:3 + num_of_advances]
+            self.assertEqual(3 + num_of_advances + 7, len(lines))
+            self.assertEqual("         1 2021-01-01           100.00                0.00", advance_lines[0])
+            self.assertEqual(
+                "     15000 2021-01-01           100.00                0.00", advance_lines[num_of_advances // 2 - 1]
+            )
+            self.assertEqual(
+                "     15001 2021-01-01           100.00              100.00", advance_lines[num_of_advances // 2]
+            )
+            self.assertEqual("     30000 2021-01-01           100.00              100.00", advance_lines[-1])
+            self.assertEqual(
+                [
+                    "",
+                    "Summary Statistics:",
+                    "----------------------------------------------------------",
+                    "Aggregate Advance Balance:                      1500000.00",
+                    "Interest Payable Balance:                           525.00",
+                    "Total Interest Paid:                                  0.00",
+                    "Balance Applicable to Future Advances:                0.00",
+                ],
+                lines[-7:],
+            )
+
+
+
+class LedgerCalculatorTest(unittest.TestCase):
+    """Ledger calculator test cases."""
+
+    def test_single_row_chunks_with_custom_interest_rate(self):
+        """Test `calculate_balances` one event per chunk at a 0.1% daily interest rate."""
+        start = date(2021, 1, 1).toordinal()
+        events = [
+            ("advance", 100000, start),
+            # 10.00 interest accrued, the remaining 20.00 reduces the first advance
+            ("payment", 3000, start + 10),
+            ("advance", 50000, start + 10),
+            # 7.40 interest accrued, 1480.00 repays both advances, 512.60 is kept for future advances
+            ("payment", 200000, start + 15),
+            ("advance", 10000, start + 20),
+            ("advance", 100000, start + 20),
+        ]
+        ledger_calculator = LedgerCalculator(
+            ([event] for event in events), "2021-01-23", interest_rate=Decimal("0.001")
+        )
+        ledger_calculator.calculate_balances()
+        self.assertEqual(
+            [Decimal("0"), Decimal("0"), Decimal("0"), Decimal("587.40")],
+            [to_decimal(balance) for balance in ledger_calculator.advance_balances],
+        )
+        self.assertEqual(Decimal("587.40"), to_decimal(ledger_calculator.overall_advance_balance))
+        # 587.40 outstanding for 3 days through the end of 2021-01-23
+        self.assertEqual(Decimal("1.7622"), to_decimal(ledger_calculator.overall_interest_payable_balance))
+        self.assertEqual(Decimal("17.40"), to_decimal(ledger_calculator.overall_interest_paid))
+        self.assertEqual(Decimal("0"), to_decimal(ledger_calculator.overall_payments_for_future))
+
 
 if __name__ == "__main__":
     unittest.main()